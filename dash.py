@@ -1,15 +1,26 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import time
 from datetime import datetime, timedelta
 import pytz
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 import sqlite3
 import os
-import json
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# orjson parses API responses several times faster; fall back to the standard library
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 # Set page configuration
 st.set_page_config(
@@ -79,32 +90,64 @@ BLOCKCHAIN_MAPPING = {
 # Database setup
 DB_PATH = "blockchain_data.db"
 
-def setup_database():
-    """Create database and tables if they don't exist"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Create tables for TVL data
-    cursor.execute('''
+# Time series tables are keyed on (blockchain, timestamp), so they are stored
+# WITHOUT ROWID: rows live directly in the primary key B-tree instead of being
+# duplicated between a rowid table and the key index
+TVL_TABLE_SQL = '''
     CREATE TABLE IF NOT EXISTS tvl_data (
         blockchain TEXT,
-        date TEXT,
         timestamp INTEGER,
         tvl REAL,
         PRIMARY KEY (blockchain, timestamp)
-    )
-    ''')
-    
-    # Create tables for price data
-    cursor.execute('''
+    ) WITHOUT ROWID
+    '''
+
+PRICE_TABLE_SQL = '''
     CREATE TABLE IF NOT EXISTS price_data (
         blockchain TEXT,
-        date TEXT,
         timestamp INTEGER,
         price REAL,
         PRIMARY KEY (blockchain, timestamp)
-    )
-    ''')
+    ) WITHOUT ROWID
+    '''
+
+def migrate_table(cursor, table, create_sql, columns):
+    """Rebuild a table whose stored definition differs from create_sql, keeping its rows"""
+    row = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (table,)
+    ).fetchone()
+    if row is None or " ".join(row[0].split()) == " ".join(create_sql.replace("IF NOT EXISTS ", "").split()):
+        return
+    
+    column_list = ", ".join(columns)
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    cursor.execute(create_sql)
+    cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {table}_old")
+    # Dropping the old table also drops any indexes that were built on it
+    cursor.execute(f"DROP TABLE {table}_old")
+
+def setup_database(conn):
+    """Tune the connection and create tables if they don't exist"""
+    cursor = conn.cursor()
+    
+    # WAL lets readers proceed while a refresh is writing, and the rest keeps
+    # hot pages and temp tables in memory
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    
+    cursor.execute("BEGIN")
+    
+    # Bring databases created with an older layout up to date
+    migrate_table(cursor, "tvl_data", TVL_TABLE_SQL, ["blockchain", "timestamp", "tvl"])
+    migrate_table(cursor, "price_data", PRICE_TABLE_SQL, ["blockchain", "timestamp", "price"])
+    
+    # Create tables for TVL and price data
+    cursor.execute(TVL_TABLE_SQL)
+    cursor.execute(PRICE_TABLE_SQL)
     
     # Create table for last update timestamp
     cursor.execute('''
@@ -115,90 +158,98 @@ def setup_database():
     ''')
     
     conn.commit()
-    conn.close()
+
+@st.cache_resource
+def get_db_connection():
+    """Open the SQLite connection shared by every session and rerun"""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    setup_database(conn)
+    # sqlite3 connections are not safe for concurrent use, so callers serialize on this lock
+    return conn, threading.Lock()
 
 # Initialize database
-setup_database()
+_conn, _db_lock = get_db_connection()
 
-# Cache for data
-data_cache = {
-    "tvl_data": {},
-    "price_data": {},
-    "last_updated": None
-}
+def shrink(df):
+    """Downcast integer columns to the smallest dtype that holds their values"""
+    for col in df.select_dtypes(include='integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    # Values stay float64: float32 is only exact to ~7 digits, so a TVL in the
+    # billions would show up to $128 off in the metric cards
+    return df
+
+def compute_metrics(df, col):
+    """Current value and 30-day % change of a series; change is None without 31 points"""
+    if df.empty:
+        return None
+    
+    values = df[col].to_numpy(dtype='float64')
+    change = None
+    if len(values) > 30:
+        change = float((values[-1] - values[-31]) / values[-31] * 100)
+    
+    return {"current": float(values[-1]), "change": change}
+
+def compute_all_metrics(tvl_data, price_data):
+    """Metrics for every blockchain, computed once per load instead of on every rerun"""
+    return {
+        blockchain: {
+            "tvl": compute_metrics(tvl_data.get(blockchain, pd.DataFrame()), 'tvl'),
+            "price": compute_metrics(price_data.get(blockchain, pd.DataFrame()), 'price')
+        }
+        for blockchain in BLOCKCHAIN_MAPPING.keys()
+    }
 
 # Database functions
-def save_tvl_data_to_db(blockchain, df):
-    """Save TVL data to SQLite database"""
+def save_tvl_data_to_db(conn, blockchain, df):
+    """Save TVL data to SQLite database; the caller holds the lock and commits"""
     if df.empty:
         return
     
-    conn = sqlite3.connect(DB_PATH)
-    
     # Convert the dataframe to a format suitable for the database
-    db_data = []
-    for _, row in df.iterrows():
-        date_str = row['date'].strftime('%Y-%m-%d')
-        timestamp = int(row['date'].timestamp())
-        db_data.append((blockchain, date_str, timestamp, float(row['tvl'])))
-    
-    # Insert data into the database
-    cursor = conn.cursor()
-    cursor.executemany(
-        "INSERT OR REPLACE INTO tvl_data (blockchain, date, timestamp, tvl) VALUES (?, ?, ?, ?)",
+    timestamps = df['date'].values.astype('datetime64[s]').astype('int64').tolist()
+    values = df['tvl'].astype('float64').tolist()
+    db_data = zip(repeat(blockchain), timestamps, values)
+    
+    # Insert data into the database; existing points are only rewritten when their
+    # value was revised, rather than deleted and re-inserted by INSERT OR REPLACE
+    conn.executemany(
+        """INSERT INTO tvl_data (blockchain, timestamp, tvl) VALUES (?, ?, ?)
+        ON CONFLICT (blockchain, timestamp) DO UPDATE SET tvl = excluded.tvl
+        WHERE tvl_data.tvl IS NOT excluded.tvl""",
         db_data
     )
-    
-    conn.commit()
-    conn.close()
 
-def save_price_data_to_db(blockchain, df):
-    """Save price data to SQLite database"""
+def save_price_data_to_db(conn, blockchain, df):
+    """Save price data to SQLite database; the caller holds the lock and commits"""
     if df.empty:
         return
     
-    conn = sqlite3.connect(DB_PATH)
-    
     # Convert the dataframe to a format suitable for the database
-    db_data = []
-    for _, row in df.iterrows():
-        date_str = row['date'].strftime('%Y-%m-%d')
-        timestamp = int(row['timestamp'] / 1000)  # Convert from ms to seconds
-        db_data.append((blockchain, date_str, timestamp, float(row['price'])))
-    
-    # Insert data into the database
-    cursor = conn.cursor()
-    cursor.executemany(
-        "INSERT OR REPLACE INTO price_data (blockchain, date, timestamp, price) VALUES (?, ?, ?, ?)",
+    timestamps = (df['timestamp'] // 1000).astype('int64').tolist()  # Convert from ms to seconds
+    values = df['price'].astype('float64').tolist()
+    db_data = zip(repeat(blockchain), timestamps, values)
+    
+    # Insert data into the database, only touching existing rows whose price changed
+    conn.executemany(
+        """INSERT INTO price_data (blockchain, timestamp, price) VALUES (?, ?, ?)
+        ON CONFLICT (blockchain, timestamp) DO UPDATE SET price = excluded.price
+        WHERE price_data.price IS NOT excluded.price""",
         db_data
     )
-    
-    conn.commit()
-    conn.close()
 
-def update_last_updated_time(timestamp):
-    """Update the last updated timestamp in the database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("DELETE FROM last_updated")
-    cursor.execute(
+def update_last_updated_time(conn, timestamp):
+    """Update the last updated timestamp in the database; the caller holds the lock and commits"""
+    conn.execute("DELETE FROM last_updated")
+    conn.execute(
         "INSERT INTO last_updated (id, timestamp) VALUES (1, ?)",
         (timestamp.isoformat(),)
     )
-    
-    conn.commit()
-    conn.close()
 
 def get_last_updated_time():
     """Get the last updated timestamp from the database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT timestamp FROM last_updated WHERE id = 1")
-    result = cursor.fetchone()
-    
-    conn.close()
+    with _db_lock:
+        result = _conn.execute("SELECT timestamp FROM last_updated WHERE id = 1").fetchone()
     
     if result:
         return datetime.fromisoformat(result[0])
@@ -206,63 +257,82 @@ def get_last_updated_time():
 
 def get_tvl_data_from_db(blockchain):
     """Retrieve TVL data from the database"""
-    conn = sqlite3.connect(DB_PATH)
-    
-    query = "SELECT date, timestamp, tvl FROM tvl_data WHERE blockchain = ? ORDER BY timestamp"
-    df = pd.read_sql_query(query, conn, params=(blockchain,))
+    query = "SELECT timestamp, tvl FROM tvl_data WHERE blockchain = ? ORDER BY timestamp"
+    with _db_lock:
+        rows = _conn.execute(query, (blockchain,)).fetchall()
     
-    conn.close()
+    # The schema is fixed, so build the columns with explicit dtypes instead of
+    # letting read_sql_query infer them row by row
+    df = pd.DataFrame({
+        'timestamp': np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+        'tvl': np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    })
     
     if not df.empty:
-        df['date'] = pd.to_datetime(df['date'])
+        df['date'] = pd.to_datetime(df['timestamp'], unit='s', cache=True)
     
-    return df
+    return shrink(df)
 
 def get_price_data_from_db(blockchain):
     """Retrieve price data from the database"""
-    conn = sqlite3.connect(DB_PATH)
+    query = "SELECT timestamp, price FROM price_data WHERE blockchain = ? ORDER BY timestamp"
+    with _db_lock:
+        rows = _conn.execute(query, (blockchain,)).fetchall()
     
-    query = "SELECT date, timestamp, price FROM price_data WHERE blockchain = ? ORDER BY timestamp"
-    df = pd.read_sql_query(query, conn, params=(blockchain,))
-    
-    conn.close()
+    df = pd.DataFrame({
+        'timestamp': np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+        'price': np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    })
     
     if not df.empty:
-        df['date'] = pd.to_datetime(df['date'])
+        df['date'] = pd.to_datetime(df['timestamp'], unit='s', cache=True)
         df['timestamp'] = df['timestamp'] * 1000  # Convert back to ms for consistency
     
-    return df
+    return shrink(df)
 
 # Get the most recent timestamp in the database for a given blockchain
 def get_latest_tvl_timestamp(blockchain):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT MAX(timestamp) FROM tvl_data WHERE blockchain = ?", 
-        (blockchain,)
-    )
-    result = cursor.fetchone()
-    
-    conn.close()
+    with _db_lock:
+        result = _conn.execute(
+            "SELECT MAX(timestamp) FROM tvl_data WHERE blockchain = ?", 
+            (blockchain,)
+        ).fetchone()
     
     return result[0] if result and result[0] else 0
 
 def get_latest_price_timestamp(blockchain):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT MAX(timestamp) FROM price_data WHERE blockchain = ?", 
-        (blockchain,)
-    )
-    result = cursor.fetchone()
-    
-    conn.close()
+    with _db_lock:
+        result = _conn.execute(
+            "SELECT MAX(timestamp) FROM price_data WHERE blockchain = ?", 
+            (blockchain,)
+        ).fetchone()
     
     return result[0] if result and result[0] else 0
 
-# Fetch TVL data from DeFiLlama
+@st.cache_resource
+def get_http_session():
+    """Create the HTTP session shared by every session and rerun, so API connections are kept alive"""
+    session = requests.Session()
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    adapter = HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=16,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504])
+    )
+    session.mount("https://", adapter)
+    return session
+
+SESSION = get_http_session()
+
+@st.cache_resource
+def get_api_semaphores():
+    """Create the per-host request caps shared by every session and rerun"""
+    return threading.Semaphore(4), threading.Semaphore(4)
+
+# Cap concurrent requests per API host so parallel refreshes stay under rate limits
+DEFILLAMA_SEMAPHORE, COINGECKO_SEMAPHORE = get_api_semaphores()
+
+# Fetch new TVL data from DeFiLlama; returns only the rows that need saving
 def fetch_tvl_data(blockchain_id, blockchain_name):
     try:
         # Get the latest timestamp from the database
@@ -270,35 +340,35 @@ def fetch_tvl_data(blockchain_id, blockchain_name):
         
         # Check if we have recent data (within the last day)
         if latest_timestamp and (time.time() - latest_timestamp) < 86400:
-            # Get data from database
-            df = get_tvl_data_from_db(blockchain_name)
-            if not df.empty:
-                return df
+            return pd.DataFrame()
         
         # If no recent data, fetch from API
         url = f"https://api.llama.fi/v2/historicalChainTvl/{blockchain_id}"
-        response = requests.get(url)
+        with DEFILLAMA_SEMAPHORE:
+            response = SESSION.get(url, timeout=(3, 15))
         if response.status_code == 200:
-            data = response.json()
+            data = json_loads(response.content)
             df = pd.DataFrame(data)
-            df['date'] = pd.to_datetime(df['date'], unit='s')
             
-            # Save to database
-            save_tvl_data_to_db(blockchain_name, df)
+            # DeFiLlama always returns the full history, so only store points from the
+            # latest one we have onward (that one is re-saved as it may have been revised)
+            df['date'] = pd.to_datetime(df['date'], unit='s')
+            if latest_timestamp:
+                df = df[df['date'] >= pd.to_datetime(latest_timestamp, unit='s')]
             
             return df
         else:
             st.error(f"Error fetching TVL data for {blockchain_id}: {response.status_code}")
             
-            # Try to get whatever we have from the database
-            return get_tvl_data_from_db(blockchain_name)
+            # Keep whatever we have in the database
+            return pd.DataFrame()
     except Exception as e:
         st.error(f"Exception when fetching TVL data for {blockchain_id}: {e}")
         
-        # Try to get data from database on error
-        return get_tvl_data_from_db(blockchain_name)
+        # Keep whatever we have in the database
+        return pd.DataFrame()
 
-# Fetch price data from CoinGecko
+# Fetch new price data from CoinGecko; returns only the rows that need saving
 def fetch_price_data(coin_id, blockchain_name):
     try:
         # Get the latest timestamp from the database
@@ -306,71 +376,85 @@ def fetch_price_data(coin_id, blockchain_name):
         
         # Check if we have recent data (within the last day)
         if latest_timestamp and (time.time() - latest_timestamp) < 86400:
-            # Get data from database
-            df = get_price_data_from_db(blockchain_name)
-            if not df.empty:
-                return df
+            return pd.DataFrame()
         
-        # If no recent data, fetch from API
+        # If no recent data, fetch from API, asking only for the days we are missing
+        if latest_timestamp:
+            days_needed = min(90, int((time.time() - latest_timestamp) / 86400) + 1)
+        else:
+            days_needed = 90
         url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart"
         params = {
             "vs_currency": "usd",
-            "days": "90",
+            "days": str(days_needed),
             "interval": "daily"
         }
-        response = requests.get(url, params=params)
+        with COINGECKO_SEMAPHORE:
+            response = SESSION.get(url, params=params, timeout=(3, 15))
         if response.status_code == 200:
-            data = response.json()
+            data = json_loads(response.content)
             prices = data.get("prices", [])
             df = pd.DataFrame(prices, columns=["timestamp", "price"])
             df['date'] = pd.to_datetime(df['timestamp'], unit='ms')
             
-            # Save to database
-            save_price_data_to_db(blockchain_name, df)
-            
             return df
         else:
             st.error(f"Error fetching price data for {coin_id}: {response.status_code}")
             
-            # Try to get whatever we have from the database
-            return get_price_data_from_db(blockchain_name)
+            # Keep whatever we have in the database
+            return pd.DataFrame()
     except Exception as e:
         st.error(f"Exception when fetching price data for {coin_id}: {e}")
         
-        # Try to get data from database on error
-        return get_price_data_from_db(blockchain_name)
+        # Keep whatever we have in the database
+        return pd.DataFrame()
 
-# Update data cache
+# Refresh the data and return it as a new snapshot
 def update_data():
-    global data_cache
-    
-    new_tvl_data = {}
-    new_price_data = {}
     current_time = datetime.now(pytz.UTC)
     
-    for blockchain, ids in BLOCKCHAIN_MAPPING.items():
-        new_tvl_data[blockchain] = fetch_tvl_data(ids["defillama"], blockchain)
-        new_price_data[blockchain] = fetch_price_data(ids["coingecko"], blockchain)
-        # Add a small delay to avoid rate limiting
-        time.sleep(1)
+    # The fetches are network bound, so run them all at once; worker threads
+    # get the script context so st.error calls still reach the page
+    with ThreadPoolExecutor(
+        max_workers=8,
+        initializer=add_script_run_ctx,
+        initargs=(None, get_script_run_ctx())
+    ) as executor:
+        tvl_futures = {
+            blockchain: executor.submit(fetch_tvl_data, ids["defillama"], blockchain)
+            for blockchain, ids in BLOCKCHAIN_MAPPING.items()
+        }
+        price_futures = {
+            blockchain: executor.submit(fetch_price_data, ids["coingecko"], blockchain)
+            for blockchain, ids in BLOCKCHAIN_MAPPING.items()
+        }
+        fetched_tvl_data = {blockchain: future.result() for blockchain, future in tvl_futures.items()}
+        fetched_price_data = {blockchain: future.result() for blockchain, future in price_futures.items()}
     
-    data_cache = {
+    # Save everything from this refresh in one transaction, so it costs a single commit
+    with _db_lock, _conn:
+        _conn.execute("BEGIN IMMEDIATE")
+        for blockchain in BLOCKCHAIN_MAPPING.keys():
+            save_tvl_data_to_db(_conn, blockchain, fetched_tvl_data[blockchain])
+            save_price_data_to_db(_conn, blockchain, fetched_price_data[blockchain])
+        
+        # Update the last updated time in the database
+        update_last_updated_time(_conn, current_time)
+    
+    new_tvl_data = {blockchain: get_tvl_data_from_db(blockchain) for blockchain in BLOCKCHAIN_MAPPING.keys()}
+    new_price_data = {blockchain: get_price_data_from_db(blockchain) for blockchain in BLOCKCHAIN_MAPPING.keys()}
+    
+    return {
         "tvl_data": new_tvl_data,
         "price_data": new_price_data,
+        "metrics": compute_all_metrics(new_tvl_data, new_price_data),
         "last_updated": current_time
     }
-    
-    # Update the last updated time in the database
-    update_last_updated_time(current_time)
-
-# Background update task
-def background_update():
-    while True:
-        update_data()
-        time.sleep(3600)  # Update every hour
 
-# Start the background update thread when the app starts
-if "thread_started" not in st.session_state:
+# Load the dashboard data once per hour for the whole process; every session and
+# rerun within the hour shares the cached result instead of running its own updater
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_all_data():
     # Check if we already have data in the database
     last_updated = get_last_updated_time()
     
@@ -384,19 +468,19 @@ if "thread_started" not in st.session_state:
             tvl_data[blockchain] = get_tvl_data_from_db(blockchain)
             price_data[blockchain] = get_price_data_from_db(blockchain)
         
-        data_cache = {
+        return {
             "tvl_data": tvl_data,
             "price_data": price_data,
+            "metrics": compute_all_metrics(tvl_data, price_data),
             "last_updated": last_updated
         }
-    else:
-        # If we don't have recent data, fetch it
-        update_data()
     
-    # Start background thread
-    update_thread = threading.Thread(target=background_update, daemon=True)
-    update_thread.start()
-    st.session_state.thread_started = True
+    # If we don't have recent data, fetch it
+    return update_data()
+
+# Snapshot of the data this run renders. Refreshes build a complete new snapshot
+# and rebind the name, so TVL, price and metrics are never read mid-update
+data_cache = get_all_data()
 
 # App header
 st.title("Token Relations Dashboard 📊")
@@ -409,9 +493,121 @@ if data_cache["last_updated"]:
 # Manual refresh button
 if st.button("🔄 Refresh Data Now"):
     with st.spinner("Fetching latest data..."):
-        update_data()
+        data_cache = update_data()
+        get_all_data.clear()
     st.success("Data refreshed successfully!")
 
+# Chart styling shared by every figure, built once rather than per chart on each rerun
+BASE_LAYOUT = dict(
+    height=400,
+    margin=dict(l=20, r=20, t=30, b=20),
+    paper_bgcolor='white',
+    plot_bgcolor='white',
+    xaxis=dict(
+        title="Date",
+        showgrid=True,
+        gridcolor='rgba(230, 230, 230, 0.8)',
+        tickfont=dict(color='#000000'),
+        title_font=dict(color='#000000')
+    ),
+    hovermode="x unified"
+)
+
+def value_axis(title):
+    return dict(
+        title=title,
+        showgrid=True,
+        gridcolor='rgba(230, 230, 230, 0.8)',
+        tickprefix="$",
+        tickfont=dict(color='#000000'),
+        title_font=dict(color='#000000')
+    )
+
+TVL_LAYOUT = dict(BASE_LAYOUT, yaxis=value_axis("TVL (USD)"))
+PRICE_LAYOUT = dict(BASE_LAYOUT, yaxis=value_axis("Price (USD)"))
+
+TVL_TRACE_STYLE = dict(
+    mode='lines',
+    name='TVL',
+    line=dict(color='#3498db', width=2),
+    fill='tozeroy',
+    fillcolor='rgba(52, 152, 219, 0.2)'
+)
+PRICE_TRACE_STYLE = dict(
+    mode='lines',
+    name='Price',
+    line=dict(color='#2ecc71', width=2),
+    fill='tozeroy',
+    fillcolor='rgba(46, 204, 113, 0.2)'
+)
+
+# Browsers can't show more points than this at chart width, so longer series are downsampled
+MAX_CHART_POINTS = 500
+
+def lttb_indices(x, y, n_out):
+    """Indices kept by Largest-Triangle-Three-Buckets downsampling of the series (x, y)"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    x = x - x[0]
+    # The first and last points are always kept; the rest are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        
+        # Keep the point forming the largest triangle with the last kept point and the next bucket's average
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(areas.argmax())
+        indices[i + 1] = a
+    
+    return indices
+
+def downsample(df, col):
+    """Reduce a series to at most MAX_CHART_POINTS rows for plotting"""
+    x = df['date'].values.astype('datetime64[s]').astype('float64')
+    y = df[col].to_numpy(dtype='float64')
+    return df.iloc[lttb_indices(x, y, MAX_CHART_POINTS)]
+
+# HTML for the section headers and metric cards, formatted with each blockchain's values
+TVL_HEADER_HTML = "<h3 style='text-align: center;'>Total Value Locked (TVL)</h3>"
+PRICE_HEADER_HTML = "<h3 style='text-align: center;'>Price (USD)</h3>"
+
+VALUE_CARD_TMPL = """
+<div class='metric-card'>
+    <h4 style="color: #000000;">{title}</h4>
+    <h2>${value:,.{decimals}f}</h2>
+</div>
+"""
+
+CHANGE_CARD_TMPL = """
+<div class='metric-card'>
+    <h4 style="color: #000000;">30-Day Change</h4>
+    <h2 style="{style}">{change:+.2f}%</h2>
+</div>
+"""
+
+def render_metric_cards(metrics, title, decimals):
+    """Show the current value and 30-day change cards when there is enough history"""
+    if not metrics or metrics["change"] is None:
+        return
+    
+    change = metrics["change"]
+    value_col, change_col = st.columns(2)
+    with value_col:
+        st.markdown(VALUE_CARD_TMPL.format(title=title, value=metrics["current"], decimals=decimals), unsafe_allow_html=True)
+    with change_col:
+        style = "color: green;" if change >= 0 else "color: red;"
+        st.markdown(CHANGE_CARD_TMPL.format(style=style, change=change), unsafe_allow_html=True)
+
 # Create dashboard layout
 for blockchain in BLOCKCHAIN_MAPPING.keys():
     st.markdown(f"## {blockchain}")
@@ -420,156 +616,41 @@ for blockchain in BLOCKCHAIN_MAPPING.keys():
     col1, col2 = st.columns(2)
     
     with col1:
-        st.markdown(f"<h3 style='text-align: center;'>Total Value Locked (TVL)</h3>", unsafe_allow_html=True)
+        st.markdown(TVL_HEADER_HTML, unsafe_allow_html=True)
         tvl_data = data_cache["tvl_data"].get(blockchain, pd.DataFrame())
         
         if not tvl_data.empty:
             # Create the TVL figure
-            fig_tvl = go.Figure()
-            fig_tvl.add_trace(
-                go.Scatter(
-                    x=tvl_data['date'], 
-                    y=tvl_data['tvl'],
-                    mode='lines',
-                    name='TVL',
-                    line=dict(color='#3498db', width=2),
-                    fill='tozeroy',
-                    fillcolor='rgba(52, 152, 219, 0.2)'
-                )
-            )
-            
-            fig_tvl.update_layout(
-                height=400,
-                margin=dict(l=20, r=20, t=30, b=20),
-                paper_bgcolor='white',
-                plot_bgcolor='white',
-                xaxis=dict(
-                    title="Date",
-                    showgrid=True,
-                    gridcolor='rgba(230, 230, 230, 0.8)',
-                    tickfont=dict(color='#000000'),
-                    title_font=dict(color='#000000')
-                ),
-                yaxis=dict(
-                    title="TVL (USD)",
-                    showgrid=True,
-                    gridcolor='rgba(230, 230, 230, 0.8)',
-                    tickprefix="$",
-                    tickfont=dict(color='#000000'),
-                    title_font=dict(color='#000000')
-                ),
-                hovermode="x unified"
+            tvl_chart_data = downsample(tvl_data, 'tvl')
+            fig_tvl = go.Figure(
+                data=[go.Scatter(x=tvl_chart_data['date'], y=tvl_chart_data['tvl'], **TVL_TRACE_STYLE)],
+                layout=TVL_LAYOUT
             )
             
             st.plotly_chart(fig_tvl, use_container_width=True)
             
-            # Calculate and display key metrics
-            if len(tvl_data) > 0:
-                current_tvl = tvl_data['tvl'].iloc[-1]
-                if len(tvl_data) > 30:
-                    month_ago_tvl = tvl_data['tvl'].iloc[-31]
-                    monthly_change = ((current_tvl - month_ago_tvl) / month_ago_tvl) * 100
-                    
-                    metrics_col1, metrics_col2 = st.columns(2)
-                    with metrics_col1:
-                        st.markdown(f"""
-                        <div class='metric-card'>
-                            <h4 style="color: #000000;">Current TVL</h4>
-                            <h2>${current_tvl:,.2f}</h2>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with metrics_col2:
-                        symbol = "+" if monthly_change >= 0 else ""
-                        if monthly_change >= 0:
-                            color_style = "color: green;"
-                        else:
-                            color_style = "color: red;"
-                        
-                        st.markdown(f"""
-                        <div class='metric-card'>
-                            <h4 style="color: #000000;">30-Day Change</h4>
-                            <h2 style="{color_style}">{symbol}{monthly_change:.2f}%</h2>
-                        </div>
-                        """, unsafe_allow_html=True)
+            # Display the key metrics precomputed when the data was loaded
+            render_metric_cards(data_cache["metrics"][blockchain]["tvl"], "Current TVL", 2)
         else:
             st.info(f"No TVL data available for {blockchain}")
     
     with col2:
-        st.markdown(f"<h3 style='text-align: center;'>Price (USD)</h3>", unsafe_allow_html=True)
+        st.markdown(PRICE_HEADER_HTML, unsafe_allow_html=True)
         price_data = data_cache["price_data"].get(blockchain, pd.DataFrame())
         
         if not price_data.empty:
             # Create the price figure
-            fig_price = go.Figure()
-            fig_price.add_trace(
-                go.Scatter(
-                    x=price_data['date'], 
-                    y=price_data['price'],
-                    mode='lines',
-                    name='Price',
-                    line=dict(color='#2ecc71', width=2),
-                    fill='tozeroy',
-                    fillcolor='rgba(46, 204, 113, 0.2)'
-                )
-            )
-            
-            fig_price.update_layout(
-                height=400,
-                margin=dict(l=20, r=20, t=30, b=20),
-                paper_bgcolor='white',
-                plot_bgcolor='white',
-                xaxis=dict(
-                    title="Date",
-                    showgrid=True,
-                    gridcolor='rgba(230, 230, 230, 0.8)',
-                    tickfont=dict(color='#000000'),
-                    title_font=dict(color='#000000')
-                ),
-                yaxis=dict(
-                    title="Price (USD)",
-                    showgrid=True,
-                    gridcolor='rgba(230, 230, 230, 0.8)',
-                    tickprefix="$",
-                    tickfont=dict(color='#000000'),
-                    title_font=dict(color='#000000')
-                ),
-                hovermode="x unified"
+            price_chart_data = downsample(price_data, 'price')
+            fig_price = go.Figure(
+                data=[go.Scatter(x=price_chart_data['date'], y=price_chart_data['price'], **PRICE_TRACE_STYLE)],
+                layout=PRICE_LAYOUT
             )
             
             st.plotly_chart(fig_price, use_container_width=True)
             
-            # Calculate and display key metrics
-            if len(price_data) > 0:
-                current_price = price_data['price'].iloc[-1]
-                if len(price_data) > 30:
-                    month_ago_price = price_data['price'].iloc[-31]
-                    price_monthly_change = ((current_price - month_ago_price) / month_ago_price) * 100
-                    
-                    price_metrics_col1, price_metrics_col2 = st.columns(2)
-                    with price_metrics_col1:
-                        st.markdown(f"""
-                        <div class='metric-card'>
-                            <h4 style="color: #000000;">Current Price</h4>
-                            <h2>${current_price:,.4f}</h2>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with price_metrics_col2:
-                        price_symbol = "+" if price_monthly_change >= 0 else ""
-                        if price_monthly_change >= 0:
-                            price_color_style = "color: green;"
-                        else:
-                            price_color_style = "color: red;"
-                        
-                        st.markdown(f"""
-                        <div class='metric-card'>
-                            <h4 style="color: #000000;">30-Day Change</h4>
-                            <h2 style="{price_color_style}">{price_symbol}{price_monthly_change:.2f}%</h2>
-                        </div>
-                        """, unsafe_allow_html=True)
+            # Display the key metrics precomputed when the data was loaded
+            render_metric_cards(data_cache["metrics"][blockchain]["price"], "Current Price", 4)
         else:
             st.info(f"No price data available for {blockchain}")
     
     st.markdown("---")
-